@@ -0,0 +1,212 @@
+import os
+import re
+import time
+import shlex
+import subprocess
+from templates import MetadataTemplate
+from verify import object_format, git_object_id
+
+ENGINES = ('subprocess', 'fast-import')
+
+# Content layout used by each engine, as named in the estimator's calibration
+LAYOUTS = {
+    'subprocess': 'single-file',
+    'fast-import': 'sharded',
+}
+
+# The fast-import engine spreads the log over commit_log/DDDD/SSSSSS.txt so
+# that no blob grows past SHARD_LINES lines and no tree past SHARDS_PER_DIR
+# entries, keeping the work per commit constant however long the run is.
+SHARD_LINES = 100
+SHARDS_PER_DIR = 100
+# fast-import keeps every object it has written in memory, so it is
+# restarted after this many commits (about 5 objects each)
+RESTART_COMMITS = 20000
+# Caps on git's delta base cache and on pack data mapped at once, which
+# otherwise grow with the repository (96 MB and 8 GB by default)
+GIT_MEMORY_LIMITS = ('-c', 'core.deltaBaseCacheLimit=8m', '-c', 'core.packedGitLimit=32m',
+                     '-c', 'core.packedGitWindowSize=1m')
+_SHARD_PATH = re.compile(r'commit_log/\d{4}/(\d{6})\.txt')
+
+
+def iter_commits(num_commits, start=1, template=None):
+    """Lazily yield (number, message, log_line, epoch, author) for each commit
+
+    Metadata is produced by the template in batches; author is None when
+    git's configured identity should be used.
+    """
+    template = template or MetadataTemplate()
+    for batch in template.batches(num_commits, start):
+        yield from batch
+
+
+def _quote(value):
+    return subprocess.list2cmdline([value]) if os.name == 'nt' else shlex.quote(value)
+
+
+def subprocess_commits(repo_path, commits, run_command, on_commit=None, should_stop=None, manifest=None):
+    """Append to commit_log.txt and run `git add` + `git commit` for every commit
+
+    run_command is called with each git command line, plus an env_vars
+    keyword for the commit itself, and must run it in repo_path. If manifest is a dict it is filled with {path: blob id} of
+    the content written, for verify_run. Returns the number of commits made.
+    """
+    log_path = os.path.join(repo_path, 'commit_log.txt')
+    made = 0
+    for i, message, line, epoch, author in commits:
+        if should_stop and should_stop():
+            break
+        with open(log_path, 'a') as f:
+            f.write(line)
+        run_command('git add .')
+        command = f'git commit -m {_quote(message)} --date=@{epoch}'
+        if author:
+            command += f' --author={_quote(author)}'
+        # --date only sets the author date; match fast-import and set both
+        run_command(command, env_vars={'GIT_COMMITTER_DATE': f'@{epoch}'})
+        made += 1
+        if on_commit:
+            on_commit(i)
+    if manifest is not None and made:
+        with open(log_path, 'rb') as f:
+            manifest['commit_log.txt'] = git_object_id('blob', f.read(), object_format(repo_path))
+    return made
+
+
+def shard_path(number, shard_lines=SHARD_LINES):
+    shard = (number - 1) // shard_lines
+    return f"commit_log/{shard // SHARDS_PER_DIR:04d}/{shard:06d}.txt"
+
+
+def _git(repo_path, *args, check=True):
+    result = subprocess.run(('git',) + args, cwd=repo_path, capture_output=True, text=True)
+    if check and result.returncode != 0:
+        raise RuntimeError(f"Command failed: git {' '.join(args)}\nError: {result.stderr.strip()}")
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def _read_blob(repo_path, spec):
+    """Raw contents of a blob such as HEAD:path, or None if it doesn't exist"""
+    result = subprocess.run(['git', 'cat-file', 'blob', spec], cwd=repo_path, capture_output=True)
+    return result.stdout if result.returncode == 0 else None
+
+
+def next_commit_number(repo_path, engine='subprocess', shard_lines=SHARD_LINES):
+    """Number the next commit of a run should get
+
+    Scale runs continue after the lines already in HEAD's sharded log, so a
+    second run adds shards instead of overwriting the first run's. The
+    single-file engine only ever appends, so its runs start at 1.
+    """
+    if engine != 'fast-import':
+        return 1
+    listing = _git(repo_path, 'ls-tree', '-r', '--name-only', 'HEAD', '--', 'commit_log/', check=False)
+    shards = [path for path in (listing or '').splitlines() if _SHARD_PATH.fullmatch(path)]
+    if not shards:
+        return 1
+    last = max(shards)
+    content = _read_blob(repo_path, f'HEAD:{last}') or b''
+    shard = int(_SHARD_PATH.fullmatch(last).group(1))
+    return shard * shard_lines + content.count(b'\n') + 1
+
+
+def _start_fast_import(repo_path):
+    return subprocess.Popen(
+        ['git', *GIT_MEMORY_LIMITS, 'fast-import', '--quiet', '--done'],
+        cwd=repo_path, stdin=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+
+
+def _finish_fast_import(proc):
+    try:
+        proc.stdin.write(b'done\n')
+        proc.stdin.close()
+    except BrokenPipeError:
+        pass
+    error = proc.stderr.read().decode(errors='replace')
+    if proc.wait() != 0:
+        raise RuntimeError(f"Command failed: git fast-import\nError: {error.strip()}")
+
+
+def fast_import_commits(repo_path, commits, on_commit=None, should_stop=None, shard_lines=SHARD_LINES,
+                        manifest=None, restart_every=RESTART_COMMITS):
+    """Stream commits into the current branch through `git fast-import`
+
+    Only the current shard is held in memory, and fast-import, which keeps
+    an entry for every object it writes, is restarted every restart_every
+    commits on top of the branch tip, so neither process grows with the
+    number of commits. Commits should be numbered from
+    next_commit_number(); a shard that already exists in HEAD is appended
+    to, never replaced. Stopping early keeps the commits already streamed.
+    The working tree is updated to the new HEAD at the end.
+    If manifest is a dict it is filled with {path: blob id} of the final
+    content of every shard written, for verify_run. Returns the number of
+    commits made.
+    """
+    branch = _git(repo_path, 'symbolic-ref', 'HEAD')
+    old_head = _git(repo_path, 'rev-parse', '--verify', '-q', 'HEAD', check=False)
+    # "Name <email> 1700000000 +0000" -> "Name <email>"
+    ident = _git(repo_path, 'var', 'GIT_COMMITTER_IDENT').rsplit(' ', 2)[0].encode()
+    tz = time.strftime('%z').encode() or b'+0000'
+    branch_line = f"commit {branch}\n".encode()
+    algorithm = object_format(repo_path)
+
+    proc = None
+    tip = old_head
+    content = bytearray()
+    current_path = None
+    first = True
+    segment = 0
+    made = 0
+    try:
+        for i, message, line, epoch, author in commits:
+            if should_stop and should_stop():
+                break
+            if proc is None:
+                proc = _start_fast_import(repo_path)
+                out = proc.stdin
+                segment = 0
+            path = shard_path(i, shard_lines)
+            if path != current_path:
+                if manifest is not None and current_path:
+                    manifest[current_path] = git_object_id('blob', content, algorithm)
+                # Only the first shard of a run can already hold lines
+                existing = _read_blob(repo_path, f'HEAD:{path}') if first and old_head else None
+                current_path = path
+                content = bytearray(existing or b'')
+            content += line.encode()
+            message = message.encode()
+
+            out.write(branch_line)
+            if author:
+                out.write(b'author %s %d %s\n' % (author.encode(), epoch, tz))
+            out.write(b'committer %s %d %s\n' % (ident, epoch, tz))
+            out.write(b'data %d\n%s\n' % (len(message), message))
+            if segment == 0 and tip:
+                out.write(b'from %s\n' % tip.encode())
+            first = False
+            out.write(b'M 100644 inline %s\ndata %d\n' % (path.encode(), len(content)))
+            out.write(content)
+            out.write(b'\n')
+            segment += 1
+            made += 1
+            if on_commit:
+                on_commit(i)
+            if segment == restart_every:
+                _finish_fast_import(proc)
+                proc = None
+                tip = _git(repo_path, 'rev-parse', branch)
+        if manifest is not None and current_path:
+            manifest[current_path] = git_object_id('blob', content, algorithm)
+    except BrokenPipeError:
+        pass
+    if proc is not None:
+        _finish_fast_import(proc)
+
+    if made:
+        # Bring the index and working tree up to the imported HEAD
+        if old_head:
+            _git(repo_path, *GIT_MEMORY_LIMITS, 'read-tree', '-m', '-u', old_head, 'HEAD')
+        else:
+            _git(repo_path, *GIT_MEMORY_LIMITS, 'read-tree', '-m', '-u', 'HEAD')
+    return made
@@ -0,0 +1,282 @@
+import os
+import time
+import shutil
+import tempfile
+import subprocess
+import configparser
+from pathlib import Path
+from commit_engine import ENGINES, LAYOUTS, iter_commits, subprocess_commits, fast_import_commits
+
+# Where measured calibration data is kept, next to the GUI settings file
+CALIBRATION_FILE = os.path.join(Path.home(), '.github_commit_gui_calibration')
+
+# Default per-commit costs, used until a calibration run has been saved.
+#   seconds_per_commit  wall time for one commit on an empty content file
+#   seconds_per_byte    extra time per commit for each byte already in the content
+#                       file, which `git add` rehashes and recompresses every time
+#   objects_per_commit  git objects written for one commit (commit + trees + blobs)
+#   packed_bytes        pack size per commit once git has delta-compressed it
+#   line_bytes          bytes appended to the content file per commit
+#   shard_lines         lines per content file before a new one starts (0 = never)
+#   compression         zlib ratio of the content file when stored as a loose blob
+#   gc_window           commits written loose before `git gc --auto` packs them
+#   retained_bytes      memory the caller keeps per commit (e.g. GUI log lines)
+#   helper_bytes        memory a long-lived git helper keeps per object written
+DEFAULT_CALIBRATION = {
+    ('subprocess', 'single-file'): {
+        'seconds_per_commit': 0.02,
+        'seconds_per_byte': 1.8e-8,
+        'objects_per_commit': 3,
+        'packed_bytes': 300,
+        'line_bytes': 34,
+        'shard_lines': 0,
+        'compression': 0.1,
+        'gc_window': 2233,
+        'retained_bytes': 0,
+        'helper_bytes': 0,
+    },
+    ('fast-import', 'sharded'): {
+        'seconds_per_commit': 0.00015,
+        'seconds_per_byte': 0.0,
+        'objects_per_commit': 5,
+        'packed_bytes': 500,
+        'line_bytes': 34,
+        'shard_lines': 100,
+        'compression': 0.1,
+        'gc_window': 0,
+        'retained_bytes': 0,
+        # fast-import is restarted every RESTART_COMMITS, so it stays small
+        'helper_bytes': 0,
+    },
+}
+
+BASE_MEMORY = 64 * 1024 * 1024
+LOOSE_BLOCK = 4096
+DISK_HEADROOM = 0.8
+# Content file size for the second calibration point
+CALIBRATION_LINES = 200000
+# Single-file runs estimated to take longer than this get pointed at scale mode
+SLOW_RUN_SECONDS = 3600
+
+
+def load_calibration(engine, layout):
+    """Return calibration data for an engine/layout, preferring saved measurements"""
+    calibration = dict(DEFAULT_CALIBRATION[(engine, layout)])
+    config = configparser.ConfigParser()
+    if os.path.exists(CALIBRATION_FILE):
+        try:
+            config.read(CALIBRATION_FILE)
+            section = f'{engine}:{layout}'
+            if section in config:
+                for key in calibration:
+                    if key in config[section]:
+                        calibration[key] = type(calibration[key])(float(config[section][key]))
+        except (configparser.Error, ValueError):
+            pass
+    return calibration
+
+
+def save_calibration(engine, layout, calibration):
+    """Store measured calibration data for later estimates"""
+    config = configparser.ConfigParser()
+    if os.path.exists(CALIBRATION_FILE):
+        config.read(CALIBRATION_FILE)
+    config[f'{engine}:{layout}'] = {key: str(value) for key, value in calibration.items()}
+    with open(CALIBRATION_FILE, 'w') as configfile:
+        config.write(configfile)
+
+
+def calibrate(engine='subprocess', sample=None):
+    """Time a small sample run in a scratch repository and save the result
+
+    The single-file engine is timed twice, on an empty content file and on
+    one of CALIBRATION_LINES lines, to fit its cost per byte of content.
+    """
+    layout = LAYOUTS[engine]
+    sample = sample or (50 if engine == 'subprocess' else 5000)
+    # Start from the defaults so costs that are not measured here get updated too
+    calibration = dict(DEFAULT_CALIBRATION[(engine, layout)])
+    scratch = tempfile.mkdtemp(prefix='commit-calibration-')
+    try:
+        def git(*args):
+            subprocess.run(('git',) + args, cwd=scratch, capture_output=True, check=True)
+
+        def run_command(command, env_vars=None):
+            subprocess.run(command, shell=True, cwd=scratch, capture_output=True, check=True,
+                           env=dict(os.environ, **env_vars) if env_vars else None)
+
+        def timed_sample(first):
+            commits = iter_commits(sample, start=first)
+            start = time.perf_counter()
+            if engine == 'fast-import':
+                fast_import_commits(scratch, commits)
+            else:
+                subprocess_commits(scratch, commits, run_command)
+            return (time.perf_counter() - start) / sample
+
+        git('init', '-q')
+        git('config', 'user.name', 'Calibration')
+        git('config', 'user.email', 'calibration@localhost')
+        git('config', 'gc.auto', '0')
+        calibration['seconds_per_commit'] = timed_sample(1)
+        git('gc', '-q')
+        pack_bytes = sum(p.stat().st_size for p in Path(scratch, '.git', 'objects', 'pack').glob('*.pack'))
+        calibration['packed_bytes'] = max(1, pack_bytes // sample)
+
+        if engine == 'subprocess':
+            log_path = os.path.join(scratch, 'commit_log.txt')
+            small = os.path.getsize(log_path)
+            with open(log_path, 'a') as f:
+                for n in range(sample + 1, CALIBRATION_LINES + 1):
+                    f.write(f"Commit {n} at 2024-01-01 00:00:00\n")
+            git('add', '.')
+            git('commit', '-q', '-m', 'Grow content file')
+            large = os.path.getsize(log_path)
+            slow = timed_sample(CALIBRATION_LINES + 1)
+            # The two samples' average file sizes differ by the bytes added in between
+            calibration['seconds_per_byte'] = max(0.0, (slow - calibration['seconds_per_commit']) / (large - small))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    save_calibration(engine, layout, calibration)
+    return calibration
+
+
+def estimate(num_commits, engine='subprocess', layout=None, calibration=None, existing_bytes=0):
+    """Predict wall time, object count, disk and memory use of a run
+
+    existing_bytes is the size of the single-file content file before the
+    run; every commit then rewrites a larger file, so time grows
+    quadratically with the number of commits.
+    """
+    layout = layout or LAYOUTS[engine]
+    c = calibration or load_calibration(engine, layout)
+    objects = num_commits * c['objects_per_commit']
+    pack_bytes = num_commits * c['packed_bytes']
+
+    # Every loose blob is a full, compressed copy of the growing content file,
+    # and up to gc_window commits stay loose before git packs them.
+    file_lines = min(num_commits, c['shard_lines']) if c['shard_lines'] else num_commits
+    final_file = file_lines * c['line_bytes']
+    loose_blob = max(LOOSE_BLOCK, int(final_file * c['compression']))
+    loose_commits = min(num_commits, c['gc_window'])
+    loose_objects = loose_commits * c['objects_per_commit']
+    loose_bytes = loose_commits * loose_blob + (loose_objects - loose_commits) * LOOSE_BLOCK
+
+    # Each commit costs a + b * (bytes already in its content file); sum that
+    # over the run, with the file starting at existing_bytes or reset per shard.
+    if c['shard_lines']:
+        content_bytes = num_commits * (min(num_commits, c['shard_lines']) - 1) / 2 * c['line_bytes']
+    else:
+        content_bytes = num_commits * existing_bytes + (num_commits - 1) * num_commits / 2 * c['line_bytes']
+    seconds = num_commits * c['seconds_per_commit'] + content_bytes * c['seconds_per_byte']
+
+    return {
+        'num_commits': num_commits,
+        'engine': engine,
+        'layout': layout,
+        'seconds': seconds,
+        'objects': objects,
+        'pack_bytes': pack_bytes,
+        'peak_disk_bytes': pack_bytes + loose_bytes + num_commits * c['line_bytes'],
+        'inodes': loose_objects + 256 + (num_commits // c['shard_lines'] if c['shard_lines'] else 1),
+        'peak_memory_bytes': (BASE_MEMORY + 2 * final_file + num_commits * c['retained_bytes']
+                              + objects * c['helper_bytes']),
+    }
+
+
+def _available_memory():
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def preflight(num_commits, repo_path, engine='subprocess', layout=None):
+    """Estimate a run and check it against free disk, inodes and memory
+
+    Returns (estimate, warnings, errors). A run should be refused when
+    errors is not empty.
+    """
+    layout = layout or LAYOUTS[engine]
+    existing_bytes = 0
+    if layout == 'single-file':
+        try:
+            existing_bytes = os.path.getsize(os.path.join(repo_path, 'commit_log.txt'))
+        except OSError:
+            pass
+    est = estimate(num_commits, engine, layout, existing_bytes=existing_bytes)
+    warnings = []
+    errors = []
+
+    if layout == 'single-file' and est['seconds'] > SLOW_RUN_SECONDS:
+        scale = estimate(num_commits, 'fast-import')
+        warnings.append(f"Each commit rewrites the whole log, so this takes ~{format_duration(est['seconds'])}; "
+                        f"scale mode would take ~{format_duration(scale['seconds'])}")
+
+    free_disk = shutil.disk_usage(repo_path).free
+    if est['peak_disk_bytes'] > free_disk:
+        errors.append(f"Needs about {format_bytes(est['peak_disk_bytes'])} of disk, "
+                      f"only {format_bytes(free_disk)} free")
+    elif est['peak_disk_bytes'] > free_disk * DISK_HEADROOM:
+        warnings.append(f"Run will use most of the free disk space ({format_bytes(free_disk)} free)")
+
+    if hasattr(os, 'statvfs'):
+        stats = os.statvfs(repo_path)
+        # Filesystems without a fixed inode table report zero here
+        if stats.f_files:
+            if est['inodes'] > stats.f_favail:
+                errors.append(f"Needs about {est['inodes']} inodes, only {stats.f_favail} free")
+            elif est['inodes'] > stats.f_favail * DISK_HEADROOM:
+                warnings.append(f"Run will use most of the free inodes ({stats.f_favail} free)")
+
+    free_memory = _available_memory()
+    if free_memory and est['peak_memory_bytes'] > free_memory:
+        warnings.append(f"Peak memory of about {format_bytes(est['peak_memory_bytes'])} "
+                        f"exceeds available memory ({format_bytes(free_memory)})")
+
+    return est, warnings, errors
+
+
+def format_bytes(num):
+    for unit in ('B', 'KB', 'MB', 'GB', 'TB'):
+        if num < 1024 or unit == 'TB':
+            return f"{num:.0f} {unit}" if unit == 'B' else f"{num:.1f} {unit}"
+        num /= 1024
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{max(seconds, 1)}s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}m {seconds}s"
+    hours, minutes = divmod(minutes, 60)
+    if hours < 24:
+        return f"{hours}h {minutes}m"
+    days, hours = divmod(hours, 24)
+    return f"{days}d {hours}h"
+
+
+def format_estimate(est):
+    """One-line summary of an estimate for the GUI and CLI"""
+    return (f"~{format_duration(est['seconds'])}, {est['objects']:,} objects, "
+            f"pack ~{format_bytes(est['pack_bytes'])}, "
+            f"peak disk ~{format_bytes(est['peak_disk_bytes'])}, "
+            f"peak RAM ~{format_bytes(est['peak_memory_bytes'])}")
+
+
+if __name__ == "__main__":
+    for engine in ENGINES:
+        print(f"Calibrating {engine} engine...")
+        result = calibrate(engine)
+        for count in (100, 10000, 1000000):
+            print(f"{count:>9} commits: {format_estimate(estimate(count, engine, calibration=result))}")
+    print(f"Saved calibration to {CALIBRATION_FILE}")
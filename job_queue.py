@@ -0,0 +1,77 @@
+from PyQt6.QtCore import QObject, QThreadPool, pyqtSignal
+
+
+class JobQueue(QObject):
+    """Runs repository jobs on a bounded thread pool
+
+    Jobs are QRunnables exposing ``signals.finished`` and ``stop()``, like
+    CommitWorker. At most ``max_concurrent`` jobs run at once; the rest wait
+    in the pool's queue until a slot frees up.
+    """
+    job_finished = pyqtSignal(object, bool, str)
+    drained = pyqtSignal()
+
+    def __init__(self, max_concurrent=2, metrics=None, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_concurrent)
+        self.metrics = metrics
+        self.jobs = []
+        self.running = set()
+
+    def set_max_concurrent(self, count):
+        self.pool.setMaxThreadCount(max(1, count))
+
+    def max_concurrent(self):
+        return self.pool.maxThreadCount()
+
+    def submit(self, job):
+        """Queue a job; it starts as soon as a slot is free"""
+        self.jobs.append(job)
+        job.signals.started.connect(lambda job=job: self._on_started(job))
+        job.signals.finished.connect(
+            lambda success, message, job=job: self._on_finished(job, success, message)
+        )
+        self.pool.start(job)
+        self._update_metrics()
+        return job
+
+    def cancel(self, job):
+        """Cancel a job, dropping it from the queue if it has not started yet"""
+        if job not in self.jobs:
+            return
+        if self.pool.tryTake(job):
+            job.signals.finished.emit(False, "Cancelled")
+        else:
+            job.stop()
+
+    def cancel_all(self):
+        for job in list(self.jobs):
+            self.cancel(job)
+
+    def active_jobs(self):
+        return list(self.jobs)
+
+    def is_busy(self, repo_path):
+        """True if a queued or running job already targets repo_path"""
+        return any(job.repo_path == repo_path for job in self.jobs)
+
+    def wait(self, msecs=-1):
+        return self.pool.waitForDone(msecs)
+
+    def _update_metrics(self):
+        if self.metrics:
+            self.metrics.set_queue_depth(len(self.jobs) - len(self.running), len(self.running))
+
+    def _on_started(self, job):
+        self.running.add(job)
+        self._update_metrics()
+
+    def _on_finished(self, job, success, message):
+        if job in self.jobs:
+            self.jobs.remove(job)
+        self.running.discard(job)
+        self._update_metrics()
+        self.job_finished.emit(job, success, message)
+        if not self.jobs:
+            self.drained.emit()
@@ -1,16 +1,34 @@
 import os
+import argparse
 import datetime
 import subprocess
 from getpass import getpass
+from estimator import preflight, format_estimate
+from profiling import RunProfiler, PROFILE_MODES
+from run_report import run_report_dir, write_run_report
+from metrics import RunMetrics, MetricsExporter, parse_push_bytes
+from commit_engine import iter_commits, next_commit_number, subprocess_commits, fast_import_commits
+from templates import MetadataTemplate, DEFAULT_MESSAGE, DISTRIBUTIONS, parse_authors
+from verify import head_commit, verify_run
+from remote_ops import RemoteScheduler, RetryBudget
 
-def run_command(command, shell=True):
+metrics = RunMetrics()
+remote = RemoteScheduler(max_concurrent=1, metrics=metrics)
+retry_budget = RetryBudget()
+
+def job_name():
+    return os.path.basename(os.getcwd()) or os.getcwd()
+
+def run_command(command, shell=True, env_vars=None):
     """Helper function to run shell commands with error handling"""
     try:
-        result = subprocess.run(command, shell=shell, capture_output=True, text=True, check=True)
+        env = dict(os.environ, **env_vars) if env_vars else None
+        result = subprocess.run(command, shell=shell, capture_output=True, text=True, check=True, env=env)
         return result.stdout.strip()
     except subprocess.CalledProcessError as e:
         print(f"Error executing command: {e.cmd}")
         print(f"Error: {e.stderr}")
+        metrics.record_error(job_name(), 'command')
         return None
 
 def setup_git_repo():
@@ -28,7 +46,7 @@ def setup_git_repo():
         if repo_url:
             run_command(f'git remote add origin {repo_url}')
 
-def push_to_github():
+def push_to_github(num_commits=1):
     """Push changes to GitHub repository"""
     print("\nPushing changes to GitHub...")
     
@@ -37,37 +55,192 @@ def push_to_github():
         print("Error: Could not determine current branch")
         return False
     
-    result = run_command('git push -u origin ' + branch)
+    def push():
+        result = subprocess.run('git push --progress -u origin ' + branch + ' 2>&1', shell=True,
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            metrics.record_error(job_name(), 'command')
+            raise RuntimeError(result.stdout.strip())
+        return result.stdout.strip()
+    
+    def on_retry(attempt, delay, error):
+        print(f"Push failed (attempt {attempt}), retrying in {delay:.1f}s; "
+              f"{retry_budget.remaining} retries left")
+    
+    try:
+        result = remote.call('push', push, retry_budget, job_name(), on_retry=on_retry, cost=num_commits)
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        result = None
     if result is None:
         print("\nPush failed. You might need to authenticate with GitHub.")
         print("Please make sure you have set up GitHub CLI (gh) or SSH keys.")
         return False
     
+    metrics.record_push_bytes(job_name(), parse_push_bytes(result))
     print("\nSuccessfully pushed to GitHub!")
     return True
 
-def make_commits():
+def make_commits(num_commits=100, engine='subprocess', template=None, verify=False):
+    """Create the commits, optionally verify them, then push
+
+    Returns the verification result, or None when not verifying.
+    """
     setup_git_repo()
+    name = job_name()
+    base = head_commit(os.getcwd())
+    manifest = {} if verify else None
+    last_percent = -1
     
-    for i in range(1, 101):
-        with open('commit_log.txt', 'a') as f:
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            f.write(f"Commit {i} at {timestamp}\n")
-        
-        run_command('git add .')
-        run_command(f'git commit -m "Commit {i}: Made at {timestamp}"')
-        
-        print(f"Created commit {i}/100")
+    def on_commit(i):
+        nonlocal last_percent
+        metrics.record_commit(name)
+        # At most one line per percent, so huge runs don't flood the terminal
+        done = i - first + 1
+        percent = done * 100 // num_commits
+        if percent != last_percent or done == num_commits:
+            last_percent = percent
+            print(f"Created commit {done}/{num_commits}")
+    
+    first = next_commit_number(os.getcwd(), engine)
+    commits = iter_commits(num_commits, start=first, template=template)
+    if engine == 'fast-import':
+        made = fast_import_commits(os.getcwd(), commits, on_commit, manifest=manifest)
+    else:
+        made = subprocess_commits(os.getcwd(), commits, run_command, on_commit, manifest=manifest)
+    
+    verification = None
+    if verify:
+        print("\nVerifying history...")
+        verification = verify_run(os.getcwd(), base, made, manifest)
+        for problem in verification['problems']:
+            print(f"Problem: {problem}")
+        if verification['problems']:
+            raise RuntimeError(f"Verification failed with {len(verification['problems'])} problem(s)")
+        print(f"Verified {verification['commits']} commits and {verification['objects']} objects "
+              f"in {verification['seconds']}s")
     
     # After all commits, push to GitHub
-    push_to_github()
+    push_to_github(made)
+    return verification
+
+def check_resources(num_commits, engine='subprocess'):
+    """Print the pre-flight estimate and return False if the run should not start"""
+    est, warnings, errors = preflight(num_commits, os.getcwd(), engine)
+    print(f"Estimate: {format_estimate(est)}")
+    for warning in warnings:
+        print(f"Warning: {warning}")
+    for error in errors:
+        print(f"Error: {error}")
+    return not errors
+
+def write_report(started, num_commits, engine, success, message, profiler, verification=None):
+    """Write the run report and any profiling artifacts for this run"""
+    report_dir = run_report_dir(os.getcwd(), started)
+    profiler.save(report_dir)
+    write_run_report(report_dir, {
+        'repo_path': os.getcwd(),
+        'num_commits': num_commits,
+        'engine': engine,
+        'started': started.isoformat(),
+        'elapsed_seconds': (datetime.datetime.now() - started).total_seconds(),
+        'success': success,
+        'message': message,
+        'profile': profiler.summary(),
+        'verification': verification,
+        'remote': dict(remote.stats(), retries=retry_budget.used),
+    })
+    if profiler.mode:
+        print(f"Profile written to {report_dir}")
 
 if __name__ == "__main__":
-    print("Starting to create 100 commits...")
+    parser = argparse.ArgumentParser(description="Create a batch of commits and push them to GitHub")
+    parser.add_argument('--count', type=int, default=100,
+                        help="number of commits to create (default: 100)")
+    parser.add_argument('--scale', action='store_true',
+                        help="stream commits through git fast-import with bounded memory, "
+                             "for very large counts")
+    parser.add_argument('--message', default=DEFAULT_MESSAGE,
+                        help="commit message template; fields: {n} {date} {epoch} {author} {name} {email}")
+    parser.add_argument('--author', action='append', default=[], metavar='"NAME <EMAIL>[=WEIGHT]"',
+                        help="commit author, may be repeated; weighted authors are drawn at random, "
+                             "unweighted ones take turns")
+    parser.add_argument('--start', metavar='YYYY-MM-DD[THH:MM:SS]',
+                        help="timestamp of the first commit; needs --step "
+                             "(default: backdated so the last commit is now)")
+    parser.add_argument('--step', type=float, metavar='SECONDS',
+                        help="time between commits, 0 or more (default: real time)")
+    parser.add_argument('--distribution', choices=DISTRIBUTIONS, default='fixed',
+                        help="how --step varies: fixed, uniform around it, or exponential (Poisson); "
+                             "needs --step")
+    parser.add_argument('--seed', help="seed for repeatable authors and timestamps")
+    parser.add_argument('--verify', action='store_true',
+                        help="check commit count, parent chain, file contents and object integrity "
+                             "before pushing")
+    parser.add_argument('--retries', type=int, default=retry_budget.retries, metavar='N',
+                        help="retries allowed for transient push failures over the whole run "
+                             f"(default: {retry_budget.retries})")
+    parser.add_argument('--max-attempts', type=int, default=remote.max_attempts, metavar='N',
+                        help=f"attempts per push before giving up (default: {remote.max_attempts})")
+    parser.add_argument('--profile', choices=PROFILE_MODES,
+                        help="profile the run with cProfile ('cpu'), tracemalloc ('memory') or both ('all')")
+    parser.add_argument('--metrics-file', metavar='PATH',
+                        help="keep a Prometheus textfile with live metrics at PATH")
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help="serve live metrics on http://127.0.0.1:PORT/metrics")
+    args = parser.parse_args()
+    if args.count <= 0:
+        parser.error("--count must be positive")
+    if args.step is None:
+        if args.start:
+            parser.error("--start needs --step")
+        if args.distribution != 'fixed':
+            parser.error("--distribution needs --step")
+    elif args.step < 0:
+        parser.error("--step must not be negative")
+    engine = 'fast-import' if args.scale else 'subprocess'
+    retry_budget.retries = max(0, args.retries)
+    remote.max_attempts = max(1, args.max_attempts)
+    try:
+        authors, weights = parse_authors(','.join(args.author))
+        start = None
+        if args.start:
+            start = datetime.datetime.fromisoformat(args.start).timestamp()
+        elif args.step is not None:
+            start = datetime.datetime.now().timestamp() - args.step * args.count
+        template = MetadataTemplate(message=args.message, authors=authors, weights=weights,
+                                    start=start, step=args.step,
+                                    distribution=args.distribution, seed=args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    if not check_resources(args.count, engine):
+        raise SystemExit(1)
+    print(f"Starting to create {args.count} commits...")
+    started = datetime.datetime.now()
+    profiler = RunProfiler(args.profile)
+    success, message = False, "Operation cancelled by user."
+    verification = None
+    exporter = None
+    if args.metrics_file or args.metrics_port is not None:
+        exporter = MetricsExporter(metrics, textfile=args.metrics_file, port=args.metrics_port).start()
+        if exporter.server:
+            print(f"Metrics at http://127.0.0.1:{exporter.port}/metrics")
+        metrics.set_queue_depth(0, 1)
     try:
-        make_commits()
-        print("\nAll 100 commits have been created and pushed to GitHub!")
+        with profiler:
+            if profiler.cpu_unavailable:
+                print(f"CPU profile {profiler.cpu_unavailable}")
+            verification = make_commits(args.count, engine, template, args.verify)
+        success, message = True, f"All {args.count} commits have been created and pushed to GitHub!"
+        print(f"\n{message}")
     except KeyboardInterrupt:
         print("\nOperation cancelled by user.")
     except Exception as e:
-        print(f"\nAn error occurred: {str(e)}")
+        message = f"An error occurred: {str(e)}"
+        print(f"\n{message}")
+        metrics.record_error(job_name(), 'run')
+    if exporter:
+        metrics.set_queue_depth(0, 0)
+        exporter.stop()
+    write_report(started, args.count, engine, success, message, profiler, verification)
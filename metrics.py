@@ -0,0 +1,207 @@
+import os
+import re
+import time
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = 'commit_generator'
+
+# "Writing objects: 100% (3/3), 1.21 KiB | 1.21 MiB/s, done."
+_PUSH_BYTES = re.compile(r'Writing objects:.*?,\s*([\d.]+)\s*(bytes|KiB|MiB|GiB)')
+_UNITS = {'bytes': 1, 'KiB': 1024, 'MiB': 1024 ** 2, 'GiB': 1024 ** 3}
+
+
+def parse_push_bytes(output):
+    """Bytes sent according to `git push --progress` output, 0 if not reported"""
+    matches = _PUSH_BYTES.findall(output or '')
+    if not matches:
+        return 0
+    value, unit = matches[-1]
+    return int(float(value) * _UNITS[unit])
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RunMetrics:
+    """Thread-safe rolling metrics shared by every job in the process
+
+    Commit counts are kept in one-second buckets so the rolling rate costs
+    the same at 10 commits/s or 10,000 commits/s.
+    """
+
+    def __init__(self, window=60):
+        self.window = window
+        self._lock = threading.Lock()
+        self.commits = {}
+        self.errors = {}
+        self.push_bytes = {}
+        self.retries = {}
+        self.remote_limit = None
+        self.queue_depth = 0
+        self.jobs_running = 0
+        self._buckets = {}
+        self._first_seen = {}
+
+    def record_commit(self, job, count=1):
+        now = int(time.time())
+        with self._lock:
+            self.commits[job] = self.commits.get(job, 0) + count
+            self._first_seen.setdefault(job, now)
+            buckets = self._buckets.setdefault(job, deque())
+            if buckets and buckets[-1][0] == now:
+                buckets[-1][1] += count
+            else:
+                buckets.append([now, count])
+                while buckets[0][0] <= now - self.window:
+                    buckets.popleft()
+
+    def record_error(self, job, kind='command', count=1):
+        """Count a failure; kind is 'command' for git/API calls, 'run' for failed jobs"""
+        with self._lock:
+            key = (job, kind)
+            self.errors[key] = self.errors.get(key, 0) + count
+
+    def record_push_bytes(self, job, count):
+        with self._lock:
+            self.push_bytes[job] = self.push_bytes.get(job, 0) + count
+
+    def record_retry(self, job, operation):
+        """Count a retried remote operation, e.g. 'push' or 'api'"""
+        with self._lock:
+            key = (job, operation)
+            self.retries[key] = self.retries.get(key, 0) + 1
+
+    def set_remote_limit(self, limit):
+        with self._lock:
+            self.remote_limit = limit
+
+    def set_queue_depth(self, queued, running):
+        with self._lock:
+            self.queue_depth = queued
+            self.jobs_running = running
+
+    def commit_rate(self, job):
+        """Commits per second over the rolling window"""
+        now = int(time.time())
+        with self._lock:
+            return self._rate(job, now)
+
+    def _rate(self, job, now):
+        cutoff = now - self.window
+        total = sum(count for second, count in self._buckets.get(job, ()) if second > cutoff)
+        # Young jobs are averaged over their lifetime, not the whole window
+        span = min(self.window, now - self._first_seen.get(job, now) + 1)
+        return total / span
+
+    def render(self):
+        """Metrics in the Prometheus text exposition format"""
+        now = int(time.time())
+        with self._lock:
+            lines = []
+
+            def family(name, kind, help_text, samples):
+                lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+                lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+                for labels, value in samples:
+                    text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                    lines.append(f"{PREFIX}_{name}{{{text}}} {value}" if text else f"{PREFIX}_{name} {value}")
+
+            family('commits_total', 'counter', 'Commits created.',
+                   [({'job': job}, value) for job, value in sorted(self.commits.items())])
+            family('commits_per_second', 'gauge', f'Commit rate over the last {self.window}s.',
+                   [({'job': job}, f"{self._rate(job, now):.3f}") for job in sorted(self.commits)])
+            family('errors_total', 'counter', 'Failed git commands, API calls and runs.',
+                   [({'job': job, 'kind': kind}, value)
+                    for (job, kind), value in sorted(self.errors.items())])
+            family('push_bytes_total', 'counter', 'Bytes sent by git push.',
+                   [({'job': job}, value) for job, value in sorted(self.push_bytes.items())])
+            family('retries_total', 'counter', 'Remote operations retried after a transient failure.',
+                   [({'job': job, 'operation': operation}, value)
+                    for (job, operation), value in sorted(self.retries.items())])
+            if self.remote_limit is not None:
+                family('remote_concurrency_limit', 'gauge', 'Remote operations allowed in flight.',
+                       [({}, self.remote_limit)])
+            family('queue_depth', 'gauge', 'Jobs waiting for a free slot.',
+                   [({}, self.queue_depth)])
+            family('jobs_running', 'gauge', 'Jobs currently running.',
+                   [({}, self.jobs_running)])
+            family('last_update_timestamp_seconds', 'gauge', 'When these metrics were rendered.',
+                   [({}, now)])
+            return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):
+        """Atomically write a textfile for the node_exporter textfile collector"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+class MetricsExporter:
+    """Publishes RunMetrics to a textfile and/or a localhost HTTP endpoint"""
+
+    def __init__(self, metrics, textfile=None, port=None, interval=5):
+        self.metrics = metrics
+        self.textfile = textfile
+        self.port = port
+        self.interval = interval
+        self.server = None
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self.textfile:
+            thread = threading.Thread(target=self._write_loop, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self.port is not None:
+            metrics = self.metrics
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split('?')[0] not in ('/', '/metrics'):
+                        self.send_error(404)
+                        return
+                    body = metrics.render().encode()
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            # Only ever bound to localhost; put a proxy in front to share it
+            self.server = ThreadingHTTPServer(('127.0.0.1', self.port), Handler)
+            self.port = self.server.server_address[1]
+            thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def _write_loop(self):
+        while True:
+            try:
+                self.metrics.write_textfile(self.textfile)
+            except OSError:
+                pass
+            if self._stop_event.wait(self.interval):
+                break
+
+    def stop(self):
+        self._stop_event.set()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        for thread in self._threads:
+            thread.join()
+        # Leave the final numbers behind for the collector
+        if self.textfile:
+            try:
+                self.metrics.write_textfile(self.textfile)
+            except OSError:
+                pass
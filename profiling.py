@@ -0,0 +1,174 @@
+import os
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+
+PROFILE_MODES = ('cpu', 'memory', 'all')
+
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_owned = False
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None if unknown"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        return peak if os.uname().sysname == 'Darwin' else peak * 1024
+    except (ImportError, AttributeError):
+        return None
+
+
+class RssSampler(threading.Thread):
+    """Samples process RSS every `interval` seconds until stopped"""
+
+    def __init__(self, interval=0.5):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+        self._start_time = time.monotonic()
+
+    def run(self):
+        while True:
+            rss = current_rss()
+            if rss is not None:
+                self.samples.append((time.monotonic() - self._start_time, rss))
+            if self._stop_event.wait(self.interval):
+                break
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            f.write("seconds,rss_bytes\n")
+            for seconds, rss in self.samples:
+                f.write(f"{seconds:.3f},{rss}\n")
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            _tracemalloc_owned = True
+        _tracemalloc_users += 1
+
+
+def _stop_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
+            _tracemalloc_owned = False
+
+
+def _write_allocations(path, snapshot, traced, top):
+    current, peak = traced
+    with open(path, 'w') as f:
+        f.write(f"Traced memory: current {current} bytes, peak {peak} bytes\n")
+        f.write(f"Top {top} allocation sites by size:\n\n")
+        stats = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        )).statistics('lineno')
+        for index, stat in enumerate(stats[:top], 1):
+            frame = stat.traceback[0]
+            f.write(f"#{index}: {frame.filename}:{frame.lineno}: "
+                    f"{stat.size / 1024:.1f} KiB in {stat.count} blocks\n")
+
+
+class RunProfiler:
+    """Profiles a block of work and saves the results next to a run report
+
+    mode is None (disabled), 'cpu' for cProfile, 'memory' for tracemalloc
+    or 'all' for both. RSS is sampled whenever profiling is on. cProfile
+    only sees the calling thread; tracemalloc and RSS cover the whole
+    process, so concurrent jobs show up in each other's memory profiles.
+
+        with RunProfiler('all') as profiler:
+            make_commits()
+        profiler.save(report_dir)
+    """
+
+    def __init__(self, mode=None, top=25, rss_interval=0.5):
+        if mode and mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        self.mode = mode
+        self.top = top
+        self.rss_interval = rss_interval
+        self.profiler = None
+        self.sampler = None
+        self.snapshot = None
+        self.traced = None
+        # Why a requested CPU profile was not taken, if it wasn't
+        self.cpu_unavailable = None
+
+    def __enter__(self):
+        if not self.mode:
+            return self
+        if self.mode in ('cpu', 'all'):
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # Python 3.12+ allows one active cProfile per process, so
+                # the second of two concurrent CPU-profiled jobs gets none
+                self.profiler = None
+                self.cpu_unavailable = "unavailable: another profiler active"
+        if self.mode in ('memory', 'all'):
+            _start_tracemalloc()
+        self.sampler = RssSampler(self.rss_interval)
+        self.sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.mode:
+            return False
+        if self.profiler:
+            self.profiler.disable()
+        self.sampler.stop()
+        if self.mode in ('memory', 'all'):
+            self.snapshot = tracemalloc.take_snapshot()
+            self.traced = tracemalloc.get_traced_memory()
+            _stop_tracemalloc()
+        return False
+
+    def summary(self):
+        """Small dict of headline numbers for the run report"""
+        if not self.mode:
+            return None
+        rss = [sample for _, sample in self.sampler.samples]
+        return {
+            'mode': self.mode,
+            'cpu_profile': self.cpu_unavailable or ('saved' if self.profiler else None),
+            'peak_rss_bytes': max(rss) if rss else None,
+            'traced_peak_bytes': self.traced[1] if self.traced else None,
+        }
+
+    def save(self, report_dir):
+        """Write profile.prof/profile.txt, allocations.txt and rss.csv"""
+        if not self.mode:
+            return
+        os.makedirs(report_dir, exist_ok=True)
+        self.sampler.write(os.path.join(report_dir, 'rss.csv'))
+        if self.profiler:
+            self.profiler.dump_stats(os.path.join(report_dir, 'profile.prof'))
+            with open(os.path.join(report_dir, 'profile.txt'), 'w') as f:
+                stats = pstats.Stats(self.profiler, stream=f)
+                stats.sort_stats('cumulative').print_stats(self.top)
+        if self.snapshot:
+            _write_allocations(os.path.join(report_dir, 'allocations.txt'),
+                               self.snapshot, self.traced, self.top)
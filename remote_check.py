@@ -0,0 +1,198 @@
+import os
+import random
+import shutil
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from remote_ops import Cancelled, RemoteScheduler, RetryBudget, TransientError, check_response
+
+# Fails the first FAILS pushes the way a flaky HTTPS remote does
+PRE_RECEIVE_HOOK = """#!/bin/sh
+count_file="$GIT_DIR/push-attempts"
+count=$(cat "$count_file" 2>/dev/null || echo 0)
+echo $((count + 1)) > "$count_file"
+if [ "$count" -lt {fails} ]; then
+    echo "error: RPC failed; HTTP 503 curl 22 The requested URL returned error: 503" >&2
+    exit 1
+fi
+"""
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def check_scheduler():
+    """Backoff, budget and AIMD behaviour, driven by a fake clock"""
+    clock = FakeClock()
+    remote = RemoteScheduler(max_concurrent=4, clock=clock, sleep=clock.sleep, rng=random.Random(1))
+    failures = [2]
+
+    def flaky():
+        clock.now += 0.2
+        if failures[0]:
+            failures[0] -= 1
+            raise TransientError("HTTP 503")
+        return 'ok'
+
+    delays = []
+    budget = RetryBudget(3)
+    assert remote.call('api', flaky, budget, on_retry=lambda attempt, delay, e: delays.append(delay)) == 'ok'
+    assert budget.used == 2 and len(delays) == 2
+    assert all(0 <= delay <= remote.base_delay * 2 ** i for i, delay in enumerate(delays))
+    assert remote.stats()['concurrency_limit'] < 4, "transient failures should cut concurrency"
+
+    failures[0] = 10
+    try:
+        remote.call('api', flaky, budget)
+        raise AssertionError("should give up once the budget is spent")
+    except TransientError:
+        assert budget.remaining == 0
+
+    def fatal():
+        raise RuntimeError("Invalid GitHub token")
+
+    budget = RetryBudget(5)
+    try:
+        remote.call('api', fatal, budget)
+        raise AssertionError("fatal errors should not be retried")
+    except RuntimeError:
+        assert budget.used == 0
+
+    failures[0] = 0
+    for _ in range(30):
+        remote.call('api', flaky)
+    assert remote.stats()['concurrency_limit'] == 4, "limit should recover after successes"
+
+    # A big push is slow in seconds but not per commit, so it must not cut the limit
+    def push(seconds):
+        def run():
+            clock.now += seconds
+        return run
+
+    for commits, seconds in ((100, 1), (100000, 600), (1000000, 5000)):
+        remote.call('push', push(seconds), cost=commits)
+    assert remote.stats()['concurrency_limit'] == 4, "large pushes should not cut the limit"
+    remote.call('push', push(60), cost=100)
+    assert remote.stats()['concurrency_limit'] == 2, "a push slow per commit should cut the limit"
+    print("Scheduler: backoff, retry budget and adaptive concurrency OK")
+
+
+def check_cancel():
+    """A job waiting for a free slot gives up once it is cancelled"""
+    remote = RemoteScheduler(max_concurrent=1)
+    holding = threading.Event()
+    release = threading.Event()
+    threading.Thread(target=remote.call, args=('push', lambda: (holding.set(), release.wait(10))),
+                     daemon=True).start()
+    holding.wait(5)
+    cancelled = threading.Event()
+    threading.Timer(0.2, cancelled.set).start()
+    called = []
+    try:
+        remote.call('push', lambda: called.append(1), should_stop=cancelled.is_set)
+        raise AssertionError("a cancelled job should not wait for a slot forever")
+    except Cancelled:
+        assert not called and remote.stats()['in_flight'] == 1
+    finally:
+        release.set()
+    print("Scheduler: a cancelled job stopped waiting for a slot")
+
+
+def check_http():
+    """Retries against a local HTTP server answering 429, then 503, then 200"""
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            status = {1: 429, 2: 503}.get(len(hits), 200)
+            self.send_response(status)
+            if status == 429:
+                self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/repos/user/repo"
+
+    def get():
+        try:
+            with urllib.request.urlopen(url, timeout=5) as response:
+                status, headers = response.status, response.headers
+        except urllib.error.HTTPError as e:
+            status, headers = e.code, e.headers
+        return check_response(SimpleNamespace(status_code=status, headers=headers, url=url))
+
+    try:
+        budget = RetryBudget(5)
+        response = RemoteScheduler(base_delay=0.05).call('api', get, budget)
+        assert response.status_code == 200 and len(hits) == 3 and budget.used == 2
+    finally:
+        server.shutdown()
+        server.server_close()
+    print("HTTP stand-in: 429 and 503 retried, then succeeded")
+
+
+def check_push():
+    """Retries a push to a bare remote whose pre-receive hook fails twice"""
+    scratch = tempfile.mkdtemp(prefix='commit-remote-')
+    try:
+        def git(*args, cwd=scratch):
+            return subprocess.run(('git',) + args, cwd=cwd, capture_output=True, text=True, check=True)
+
+        def setup(fails):
+            bare = os.path.join(scratch, f'remote-{fails}.git')
+            work = os.path.join(scratch, f'work-{fails}')
+            git('init', '-q', '--bare', bare)
+            hook = os.path.join(bare, 'hooks', 'pre-receive')
+            with open(hook, 'w') as f:
+                f.write(PRE_RECEIVE_HOOK.format(fails=fails))
+            os.chmod(hook, 0o755)
+            git('init', '-q', work)
+            git('-c', 'user.name=Remote Check', '-c', 'user.email=remote-check@localhost',
+                'commit', '-q', '--allow-empty', '-m', 'Initial commit', cwd=work)
+            git('remote', 'add', 'origin', bare, cwd=work)
+
+            def push():
+                result = subprocess.run(['git', 'push', '-q', 'origin', 'HEAD'], cwd=work,
+                                        capture_output=True, text=True)
+                if result.returncode != 0:
+                    raise RuntimeError(result.stderr.strip())
+            return push
+
+        budget = RetryBudget(5)
+        RemoteScheduler(base_delay=0.05).call('push', setup(2), budget)
+        assert budget.used == 2
+
+        budget = RetryBudget(1)
+        try:
+            RemoteScheduler(base_delay=0.05).call('push', setup(3), budget)
+            raise AssertionError("should give up once the budget is spent")
+        except RuntimeError as e:
+            assert 'RPC failed' in str(e) and budget.remaining == 0
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    print("Git stand-in: push retried past two failures, and gave up when the budget ran out")
+
+
+if __name__ == "__main__":
+    check_scheduler()
+    check_cancel()
+    check_http()
+    check_push()
@@ -0,0 +1,252 @@
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+
+# HTTP statuses worth another try: timeouts, rate limits and server errors
+RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+# git output for failures that usually clear up on their own
+TRANSIENT_GIT_ERRORS = (
+    'Could not resolve host',
+    'Connection timed out',
+    'Connection reset',
+    'Connection refused',
+    'Failed to connect',
+    'Operation timed out',
+    'RPC failed',
+    'remote end hung up unexpectedly',
+    'early EOF',
+    'The requested URL returned error: 429',
+    'The requested URL returned error: 50',
+    'gnutls_handshake() failed',
+    'SSL_ERROR_SYSCALL',
+)
+
+# Exception class names (requests' or the standard library's) for network trouble
+TRANSIENT_EXCEPTIONS = frozenset({'ConnectionError', 'Timeout', 'TimeoutError', 'ChunkedEncodingError'})
+
+
+class TransientError(RuntimeError):
+    """A remote failure worth retrying
+
+    retry_after is how long the server asked us to wait, in seconds, if it said.
+    """
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Cancelled(RuntimeError):
+    """The job was cancelled before its remote operation could start"""
+
+
+def is_transient(error):
+    """True if an exception from a push or API call is worth retrying"""
+    if isinstance(error, TransientError):
+        return True
+    if any(cls.__name__ in TRANSIENT_EXCEPTIONS for cls in type(error).__mro__):
+        return True
+    response = getattr(error, 'response', None)
+    if getattr(response, 'status_code', None) in RETRY_STATUSES:
+        return True
+    text = str(error)
+    return any(marker in text for marker in TRANSIENT_GIT_ERRORS)
+
+
+def retry_after(headers):
+    """Seconds a server asked us to wait, from Retry-After or GitHub's rate limit headers"""
+    value = headers.get('Retry-After')
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                return None
+    if headers.get('X-RateLimit-Remaining') == '0' and headers.get('X-RateLimit-Reset'):
+        try:
+            return max(0.0, float(headers['X-RateLimit-Reset']) - time.time())
+        except ValueError:
+            return None
+    return None
+
+
+def check_response(response):
+    """Raise TransientError for an HTTP response worth retrying, otherwise return it
+
+    GitHub answers rate-limited requests with 403 plus rate limit headers,
+    so those count as transient too.
+    """
+    status = response.status_code
+    wait = retry_after(response.headers)
+    if status in RETRY_STATUSES or (status == 403 and wait is not None):
+        raise TransientError(f"HTTP {status} from {response.url}", retry_after=wait)
+    return response
+
+
+class RetryBudget:
+    """Retries allowed for one run, shared by all of its remote operations"""
+
+    def __init__(self, retries=10):
+        self.retries = retries
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def spend(self):
+        """Take one retry from the budget; False when none are left"""
+        with self._lock:
+            if self.used >= self.retries:
+                return False
+            self.used += 1
+            return True
+
+    @property
+    def remaining(self):
+        return self.retries - self.used
+
+
+class RemoteScheduler:
+    """Runs remote operations with jittered backoff and adaptive concurrency
+
+    One scheduler is shared by every job in the process. The number of
+    operations allowed in flight follows AIMD: it grows by about one slot
+    per round of fast successes, and halves on a transient failure or on
+    an attempt more than latency_factor times slower than that operation's
+    running average. It never drops below one. Latency is tracked per
+    operation and per unit of `cost` (e.g. commits pushed), so a big push
+    is not mistaken for a slow API call. Failures from operations that
+    started before the last cut don't cut again, so one burst of errors
+    halves the limit once.
+
+    A failed attempt waits a random time between 0 and
+    base_delay * 2**(attempt - 1), capped at max_delay, or longer if the
+    server asked for it. The randomness spreads out parallel jobs that hit
+    the same rate limit instead of having them retry together.
+
+    clock, sleep and rng can be replaced to drive it deterministically;
+    a replacement sleep must advance the replacement clock.
+    """
+
+    def __init__(self, max_concurrent=4, max_attempts=5, base_delay=1.0, max_delay=60.0,
+                 latency_factor=3.0, error_threshold=0.1, smoothing=0.2, metrics=None,
+                 clock=time.monotonic, sleep=time.sleep, rng=None):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.latency_factor = latency_factor
+        self.error_threshold = error_threshold
+        self.smoothing = smoothing
+        self.metrics = metrics
+        self.clock = clock
+        self.sleep = sleep
+        self.rng = rng or random.Random()
+        self.limit = float(self.max_concurrent)
+        self.in_flight = 0
+        self.latency = {}
+        self.error_rate = 0.0
+        self._last_cut = None
+        self._cond = threading.Condition()
+        self._publish()
+
+    def call(self, operation, fn, budget=None, job=None, should_stop=None, on_retry=None, cost=1):
+        """Run fn() until it succeeds, retrying transient failures
+
+        Re-raises the last error when it is not transient, after
+        max_attempts, when budget has no retries left, or when should_stop()
+        turns true during a backoff wait. Raises Cancelled if should_stop()
+        turns true while waiting for a free slot. on_retry(attempt, delay,
+        error) is called before each wait. cost is the size of the work,
+        e.g. commits in a push; latency is compared per unit of it.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            started = self._acquire(should_stop)
+            try:
+                result = fn()
+            except Exception as e:
+                transient = is_transient(e)
+                self._release(operation, started, 'transient' if transient else 'fatal', cost)
+                if not transient or attempt >= self.max_attempts:
+                    raise
+                if budget is not None and not budget.spend():
+                    raise
+                delay = self.backoff(attempt, getattr(e, 'retry_after', None))
+                if self.metrics:
+                    self.metrics.record_retry(job, operation)
+                if on_retry:
+                    on_retry(attempt, delay, e)
+                if not self._wait(delay, should_stop):
+                    raise
+                continue
+            self._release(operation, started, 'ok', cost)
+            return result
+
+    def backoff(self, attempt, retry_after=None):
+        """Delay before retrying after the given failed attempt ("full jitter")"""
+        delay = self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def stats(self):
+        """Current state of the scheduler for run reports"""
+        with self._cond:
+            return {
+                'concurrency_limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'latency_seconds': {operation: round(latency, 6) for operation, latency in self.latency.items()},
+                'error_rate': round(self.error_rate, 3),
+            }
+
+    def _acquire(self, should_stop=None):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                if should_stop and should_stop():
+                    raise Cancelled("Cancelled while waiting for a remote slot")
+                # Wake up now and then to notice a cancelled job
+                self._cond.wait(0.5)
+            self.in_flight += 1
+            return self.clock()
+
+    def _release(self, operation, started, outcome, cost):
+        with self._cond:
+            self.in_flight -= 1
+            # Errors that aren't transient say nothing about load
+            if outcome != 'fatal':
+                alpha = self.smoothing
+                latency = (self.clock() - started) / max(cost, 1)
+                failed = 1.0 if outcome == 'transient' else 0.0
+                self.error_rate += alpha * (failed - self.error_rate)
+                average = self.latency.get(operation)
+                slow = False
+                # Failed attempts are often timeouts; keep them out of the baseline
+                if not failed:
+                    slow = average is not None and latency > average * self.latency_factor
+                    self.latency[operation] = latency if average is None else average + alpha * (latency - average)
+                if failed or slow:
+                    if self._last_cut is None or started >= self._last_cut:
+                        self.limit = max(1.0, self.limit / 2)
+                        self._last_cut = self.clock()
+                elif self.error_rate < self.error_threshold:
+                    self.limit = min(float(self.max_concurrent), self.limit + 1 / self.limit)
+            self._cond.notify_all()
+            self._publish()
+
+    def _publish(self):
+        if self.metrics:
+            self.metrics.set_remote_limit(int(self.limit))
+
+    def _wait(self, delay, should_stop):
+        deadline = self.clock() + delay
+        while True:
+            if should_stop and should_stop():
+                return False
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                return True
+            self.sleep(min(remaining, 0.5))
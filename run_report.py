@@ -0,0 +1,29 @@
+import os
+import json
+import datetime
+import tempfile
+
+
+def run_report_dir(repo_path, started=None):
+    """Directory for one run's report and profiling artifacts
+
+    Reports live inside .git so that `git add .` never commits them. If the
+    repository has not been initialised they go to the temp directory
+    instead, so we never create a half-made .git folder.
+    """
+    started = started or datetime.datetime.now()
+    run_id = started.strftime("%Y%m%d-%H%M%S")
+    git_dir = os.path.join(os.path.abspath(repo_path), '.git')
+    if os.path.isfile(os.path.join(git_dir, 'HEAD')):
+        return os.path.join(git_dir, 'commit-generator', 'runs', run_id)
+    name = os.path.basename(os.path.abspath(repo_path)) or 'repo'
+    return os.path.join(tempfile.gettempdir(), 'commit-generator', f'{name}-{run_id}')
+
+
+def write_run_report(report_dir, report):
+    """Write report.json into report_dir and return its path"""
+    os.makedirs(report_dir, exist_ok=True)
+    path = os.path.join(report_dir, 'report.json')
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+    return path
@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+from commit_engine import RESTART_COMMITS, iter_commits, fast_import_commits
+from estimator import format_bytes
+
+# Counts checked by default, and how much their peak may exceed the baseline
+COUNTS = (10000, 100000, 1000000)
+TOLERANCE = 0.2
+# Memory grows until fast-import is first restarted, then should stay flat
+BASELINE = 2 * RESTART_COMMITS
+
+
+def _status(pid):
+    """(parent pid, private bytes, file-backed bytes) from /proc/<pid>/status"""
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                fields[key] = value.split()
+    except OSError:
+        return None, 0, 0
+    ppid = fields.get('PPid', [None])[0]
+    return (ppid, int(fields.get('RssAnon', [0])[0]) * 1024,
+            int(fields.get('RssFile', [0])[0]) * 1024)
+
+
+class TreeSampler(threading.Thread):
+    """Samples memory of this process plus its children, e.g. git fast-import
+
+    Private (anonymous) memory is what a run really costs. File-backed
+    pages are mapped pack and index files, which the kernel can drop; they
+    are reported separately.
+    """
+
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak_private = 0
+        self.peak_mapped = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        me = str(os.getpid())
+        while True:
+            _, private, mapped = _status(me)
+            for pid in os.listdir('/proc'):
+                if pid.isdigit():
+                    ppid, child_private, child_mapped = _status(pid)
+                    if ppid == me:
+                        private += child_private
+                        mapped += child_mapped
+            self.peak_private = max(self.peak_private, private)
+            self.peak_mapped = max(self.peak_mapped, mapped)
+            if self._stop_event.wait(self.interval):
+                break
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def peak_memory(num_commits):
+    """Peak (private, mapped) bytes while streaming num_commits into a scratch repository"""
+    scratch = tempfile.mkdtemp(prefix='commit-scale-')
+    try:
+        def git(*args):
+            subprocess.run(('git',) + args, cwd=scratch, capture_output=True, check=True)
+
+        git('init', '-q')
+        git('config', 'user.name', 'Scale Check')
+        git('config', 'user.email', 'scale-check@localhost')
+        git('config', 'gc.auto', '0')
+        sampler = TreeSampler()
+        sampler.start()
+        try:
+            made = fast_import_commits(scratch, iter_commits(num_commits))
+        finally:
+            sampler.stop()
+        if made != num_commits:
+            raise RuntimeError(f"Made {made} of {num_commits} commits")
+        return sampler.peak_private, sampler.peak_mapped
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    if not os.path.exists('/proc/self/status'):
+        raise SystemExit("scale_check.py reads /proc and needs Linux")
+    counts = [int(arg) for arg in sys.argv[1:]] or COUNTS
+    peaks = {}
+    for count in [BASELINE, *counts]:
+        started = time.monotonic()
+        private, mapped = peak_memory(count)
+        peaks[count] = private
+        print(f"{count:>9} commits: peak private memory {format_bytes(private)}, "
+              f"mapped pack files {format_bytes(mapped)}, {time.monotonic() - started:.0f}s")
+    limit = peaks[BASELINE] * (1 + TOLERANCE)
+    over = {count: peak for count, peak in peaks.items() if peak > limit}
+    assert not over, (f"Peak private memory exceeded {format_bytes(limit)} at "
+                      + ", ".join(f"{count} commits ({format_bytes(peak)})" for count, peak in over.items()))
+    print(f"Peak private memory stayed within {TOLERANCE:.0%} of {format_bytes(peaks[BASELINE])} "
+          f"(the {BASELINE}-commit baseline)")
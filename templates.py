@@ -0,0 +1,189 @@
+import time
+import random
+import string
+import datetime
+import itertools
+
+DEFAULT_MESSAGE = "Commit {n}: Made at {date}"
+DEFAULT_LINE = "Commit {n} at {date}"
+FIELDS = ('n', 'date', 'epoch', 'author', 'name', 'email')
+DISTRIBUTIONS = ('fixed', 'uniform', 'exponential')
+
+
+def _fields(template):
+    """Names used by a str.format template, rejecting anything we don't provide"""
+    names = set()
+    for _, name, _, _ in string.Formatter().parse(template):
+        if name is None:
+            continue
+        if name not in FIELDS:
+            raise ValueError(f"Unknown template field {{{name}}}; use one of: "
+                             + ", ".join(f"{{{field}}}" for field in FIELDS))
+        names.add(name)
+    return names
+
+
+def compile_template(template):
+    """Turn a str.format template into a fast function of the FIELDS
+
+    The template is parsed once into a single concatenation expression, so
+    each commit pays for one function call instead of str.format parsing.
+    Only validated field names and repr()'d literals reach the compiler.
+    """
+    _fields(template)
+    parts = []
+    for literal, name, spec, conversion in string.Formatter().parse(template):
+        if literal:
+            parts.append(repr(literal))
+        if name is None:
+            continue
+        value = {'r': f'repr({name})', 'a': f'ascii({name})'}.get(conversion, name)
+        parts.append(f'format({value}, {spec!r})' if spec else f'str({value})')
+    body = ' + '.join(parts) or "''"
+    return eval(f"lambda {', '.join(FIELDS)}: {body}", {'__builtins__': {
+        'format': format, 'str': str, 'repr': repr, 'ascii': ascii}})
+
+
+def parse_authors(text):
+    """Parse 'Name <email>=weight, Other <email>' into (authors, weights)
+
+    Weights are optional; without any the authors are used in turn.
+    """
+    authors = []
+    weights = []
+    for entry in text.replace(';', ',').split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        author, _, weight = entry.partition('>=')
+        author = author.strip() + ('>' if weight else '')
+        if '<' not in author or not author.endswith('>'):
+            raise ValueError(f"Author must look like 'Name <email>': {entry}")
+        authors.append(author)
+        weights.append(float(weight) if weight else None)
+    if any(weight is not None for weight in weights):
+        return authors, [1.0 if weight is None else weight for weight in weights]
+    return authors, None
+
+
+class MetadataTemplate:
+    """Precompiled message, author and timestamp templates for a run
+
+    Templates are compiled once, and metadata comes out in batches of
+    (number, message, log_line, epoch, author) tuples. author is
+    "Name <email>", or None to use git's configured identity.
+
+    Timestamps come from the wall clock as each commit is made when step
+    is None. Otherwise they start at `start` (epoch seconds, default now) and advance by `step`
+    seconds per commit: exactly with 'fixed', uniformly between 0 and
+    2*step with 'uniform', or as a Poisson process with 'exponential'.
+    Authors are drawn by weight if weights are given, otherwise in turn.
+    A seed makes every draw repeatable.
+    """
+
+    def __init__(self, message=DEFAULT_MESSAGE, line=DEFAULT_LINE, authors=None, weights=None,
+                 start=None, step=None, distribution='fixed', seed=None):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"Unknown time distribution: {distribution}")
+        if weights and len(weights) != len(authors or ()):
+            raise ValueError("Need one weight per author")
+        if step is not None and step < 0:
+            raise ValueError("Time step must not be negative")
+        used = _fields(message) | _fields(line)
+        self.message = message
+        self.line = line + '\n'
+        self.format_message = compile_template(self.message)
+        self.format_line = compile_template(self.line)
+        self.needs_date = 'date' in used
+        self.needs_name = bool(used & {'name', 'email'})
+        self.authors = list(authors or [])
+        self.cum_weights = list(itertools.accumulate(weights)) if weights else None
+        self.start = start
+        self.step = step
+        self.distribution = distribution
+        self.rng = random.Random(seed)
+
+        # Dates are rendered from a fixed UTC offset plus a one-day cache,
+        # instead of calling strftime for every commit.
+        reference = start if start is not None else time.time()
+        offset = datetime.datetime.fromtimestamp(reference).astimezone().utcoffset()
+        self.utc_offset = int(offset.total_seconds()) if offset else 0
+        self._day = None
+        self._day_prefix = None
+        self._last_epoch = None
+        self._last_date = None
+
+    def format_date(self, epoch):
+        # Many commits share a second, so remember the last one
+        if epoch == self._last_epoch:
+            return self._last_date
+        self._last_epoch = epoch
+        days, seconds = divmod(epoch + self.utc_offset, 86400)
+        if days != self._day:
+            self._day = days
+            day = datetime.datetime(1970, 1, 1) + datetime.timedelta(days=days)
+            self._day_prefix = day.strftime("%Y-%m-%d ")
+        hours, seconds = divmod(seconds, 3600)
+        minutes, seconds = divmod(seconds, 60)
+        self._last_date = f"{self._day_prefix}{hours:02d}:{minutes:02d}:{seconds:02d}"
+        return self._last_date
+
+    def _epochs(self, count, state):
+        if self.step is None:
+            return None
+        epochs = []
+        clock = state['clock']
+        rng = self.rng
+        for _ in range(count):
+            epochs.append(int(clock))
+            if self.distribution == 'fixed':
+                clock += self.step
+            elif self.distribution == 'uniform':
+                clock += rng.uniform(0, 2 * self.step)
+            elif self.step > 0:
+                clock += rng.expovariate(1 / self.step)
+        state['clock'] = clock
+        return epochs
+
+    def _authors(self, count, state):
+        if not self.authors:
+            return itertools.repeat(None, count)
+        if self.cum_weights:
+            return self.rng.choices(self.authors, cum_weights=self.cum_weights, k=count)
+        first = state['author']
+        state['author'] = (first + count) % len(self.authors)
+        return itertools.islice(itertools.cycle(self.authors), first, first + count)
+
+    def batches(self, num_commits, first=1, batch_size=1000):
+        """Yield lists of commit metadata, batch_size commits at a time
+
+        With wall clock timestamps each commit is its own batch, so it is
+        stamped when the engine asks for it rather than up to a batch early.
+        """
+        if self.step is None:
+            batch_size = 1
+        state = {
+            'clock': float(self.start if self.start is not None else time.time()),
+            'author': 0,
+        }
+        format_message = self.format_message
+        format_line = self.format_line
+        format_date = self.format_date
+        needs_date = self.needs_date
+        needs_name = self.needs_name
+        end = first + num_commits
+        for batch_first in range(first, end, batch_size):
+            count = min(batch_size, end - batch_first)
+            epochs = self._epochs(count, state)
+            batch = []
+            for offset, author in enumerate(self._authors(count, state)):
+                n = batch_first + offset
+                epoch = epochs[offset] if epochs else int(time.time())
+                date = format_date(epoch) if needs_date else ''
+                name = email = ''
+                if needs_name and author:
+                    name, _, email = author.partition(' <')
+                    email = email.rstrip('>')
+                fields = (n, date, epoch, author or '', name, email)
+                batch.append((n, format_message(*fields), format_line(*fields), epoch, author))
+            yield batch
@@ -0,0 +1,219 @@
+import os
+import time
+import hashlib
+import threading
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+CHUNK_OBJECTS = 20000
+MAX_PROBLEMS = 100
+READ_BYTES = 1024 * 1024
+
+
+def object_format(repo_path):
+    """Hash algorithm of the repository, 'sha1' or 'sha256'"""
+    result = subprocess.run(['git', 'rev-parse', '--show-object-format'], cwd=repo_path,
+                            capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 and result.stdout.strip() else 'sha1'
+
+
+def head_commit(repo_path):
+    """Commit HEAD points at, or None in a repository without commits"""
+    result = subprocess.run(['git', 'rev-parse', '--verify', '-q', 'HEAD'], cwd=repo_path,
+                            capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def git_object_id(kind, data, algorithm='sha1'):
+    """Object id git would give `data` stored as a `kind` object"""
+    digest = hashlib.new(algorithm, b'%s %d\0' % (kind.encode(), len(data)))
+    digest.update(data)
+    return digest.hexdigest()
+
+
+def check_history(repo_path, base, expected_count):
+    """Check that HEAD is exactly expected_count commits in a single chain on top of base
+
+    Returns (commit_count, problems). Streams rev-list, so memory does not
+    depend on history length.
+    """
+    problems = []
+    revs = ['HEAD', f'^{base}'] if base else ['HEAD']
+    proc = subprocess.Popen(['git', 'rev-list', '--parents'] + revs, cwd=repo_path,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    count = 0
+    expected_next = None
+    last_parents = []
+    for line in proc.stdout:
+        oid, *parents = line.split()
+        count += 1
+        if expected_next and oid != expected_next and len(problems) < MAX_PROBLEMS:
+            problems.append(f"Commit {expected_next} is missing from the chain (found {oid})")
+        if len(parents) > 1 and len(problems) < MAX_PROBLEMS:
+            problems.append(f"Commit {oid} has {len(parents)} parents, expected one")
+        expected_next = parents[0] if parents else None
+        last_parents = parents
+    error = proc.stderr.read()
+    if proc.wait() != 0:
+        return count, [f"git rev-list failed: {error.strip()}"]
+
+    if count and base and last_parents[:1] != [base]:
+        problems.append(f"Oldest new commit does not descend from {base}")
+    if count and not base and last_parents:
+        problems.append("Oldest commit was expected to be a root commit")
+    if count != expected_count:
+        problems.append(f"Expected {expected_count} new commits, found {count}")
+    return count, problems
+
+
+def check_tree(repo_path, manifest):
+    """Compare HEAD's tree against a {path: blob id} manifest from the engine"""
+    if not manifest:
+        return []
+    problems = []
+    remaining = dict(manifest)
+    proc = subprocess.Popen(['git', 'ls-tree', '-r', '-z', 'HEAD'], cwd=repo_path,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    for entry in proc.stdout.read().split(b'\0'):
+        if not entry:
+            continue
+        info, path = entry.split(b'\t', 1)
+        path = path.decode(errors='surrogateescape')
+        expected = remaining.pop(path, None)
+        if expected is None:
+            continue
+        oid = info.split()[2].decode()
+        if oid != expected and len(problems) < MAX_PROBLEMS:
+            problems.append(f"{path} is {oid} in HEAD, expected {expected}")
+    error = proc.stderr.read().decode(errors='replace')
+    if proc.wait() != 0:
+        return [f"git ls-tree failed: {error.strip()}"]
+    for path in list(remaining)[:MAX_PROBLEMS - len(problems)]:
+        problems.append(f"{path} is missing from HEAD")
+    return problems
+
+
+def _verify_chunk(repo_path, oids, algorithm):
+    """Stream a chunk of objects through one `cat-file --batch` and rehash them
+
+    Runs in a worker process; only the oids and the mismatches cross the
+    process boundary, and object contents are hashed in pieces as they are
+    read, so memory stays bounded however large the blobs get.
+    """
+    proc = subprocess.Popen(['git', 'cat-file', '--batch', '--buffer'], cwd=repo_path,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    # Feed the ids from a thread so git never blocks on a full stdout pipe
+    def feed():
+        try:
+            proc.stdin.write(('\n'.join(oids) + '\n').encode())
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    problems = []
+    checked = 0
+    out = proc.stdout
+    for header in iter(out.readline, b''):
+        fields = header.split()
+        if len(fields) != 3:
+            problems.append(f"Unreadable object {fields[0].decode() if fields else '?'}")
+            continue
+        oid, kind, size = fields[0].decode(), fields[1], int(fields[2])
+        digest = hashlib.new(algorithm, b'%s %d\0' % (kind, size))
+        remaining = size
+        while remaining:
+            piece = out.read(min(remaining, READ_BYTES))
+            if not piece:
+                break
+            digest.update(piece)
+            remaining -= len(piece)
+        out.read(1)
+        checked += 1
+        if remaining or digest.hexdigest() != oid:
+            problems.append(f"Object {oid} does not match its contents")
+    feeder.join()
+    error = proc.stderr.read().decode(errors='replace')
+    if proc.wait() != 0:
+        return checked, [f"git cat-file failed: {error.strip()}"]
+    return checked, problems
+
+
+def _iter_oid_chunks(repo_path, size):
+    # Pack order keeps each chunk's reads sequential and its delta bases
+    # cached; sorted object ids would make every read a random seek.
+    proc = subprocess.Popen(['git', 'cat-file', '--batch-all-objects', '--unordered',
+                             '--batch-check=%(objectname)'],
+                            cwd=repo_path, stdout=subprocess.PIPE, text=True)
+    chunk = []
+    for line in proc.stdout:
+        chunk.append(line.strip())
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+    proc.wait()
+
+
+def check_objects(repo_path, workers=None, on_progress=None):
+    """Rehash every object in the repository across a process pool
+
+    Returns (objects_checked, problems).
+    """
+    algorithm = object_format(repo_path)
+    workers = workers or os.cpu_count() or 1
+    checked = 0
+    problems = []
+    # Spawned workers are safe to start from GUI worker threads
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        pending = set()
+
+        def collect(done):
+            nonlocal checked
+            for future in done:
+                count, chunk_problems = future.result()
+                checked += count
+                problems.extend(chunk_problems[:MAX_PROBLEMS - len(problems)])
+            if on_progress:
+                on_progress(checked)
+
+        for oids in _iter_oid_chunks(repo_path, CHUNK_OBJECTS):
+            # Keep a couple of chunks per worker in flight to bound memory
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(pool.submit(_verify_chunk, repo_path, oids, algorithm))
+        done, _ = wait(pending)
+        collect(done)
+    return checked, problems
+
+
+def verify_run(repo_path, base, expected_count, manifest=None, workers=None, on_progress=None):
+    """Verify a generated history: commit count, parent chain, tree and objects
+
+    base is the commit HEAD pointed at before the run (None for a new
+    history). Returns a dict for the run report; 'problems' is empty when
+    everything checks out.
+    """
+    started = time.monotonic()
+    # The history walk is a single git process; run it alongside the pool
+    history = {}
+    walker = threading.Thread(target=lambda: history.update(
+        result=check_history(repo_path, base, expected_count)))
+    walker.start()
+    objects, object_problems = check_objects(repo_path, workers, on_progress)
+    walker.join()
+    commits, problems = history['result']
+    problems += check_tree(repo_path, manifest)
+    problems += object_problems
+    return {
+        'commits': commits,
+        'objects': objects,
+        'seconds': round(time.monotonic() - started, 3),
+        'problems': problems[:MAX_PROBLEMS],
+    }